@@ -14,6 +14,20 @@ st.set_page_config(
 def load_data():
     return pd.read_csv("Household Tax Income Changes.csv")
 
+# Household IDs for the "Find Interesting Cases" shortcuts, computed once.
+# The leading underscore stops Streamlit from re-hashing the whole frame on every call.
+@st.cache_data
+def compute_interesting_cases(_df):
+    # One gather of the three ranked columns; the nan-aware reductions skip NaN like idxmax does
+    arr = _df[['Total Change in Federal Tax Liability', 'Total Change in Net Income', 'Percentage Change in Federal Tax Liability']].to_numpy()
+    ids = _df['Household ID'].to_numpy()
+    return {
+        "Biggest Tax Increase": ids[np.nanargmax(arr[:, 0])],
+        "Biggest Tax Decrease": ids[np.nanargmin(arr[:, 0])],
+        "Highest Income Impact": ids[np.nanargmax(np.abs(arr[:, 1]))],
+        "Largest Percentage Change": ids[np.nanargmax(np.abs(arr[:, 2]))]
+    }
+
 # Main app
 def main():
     st.title("🏠 HR1 Tax Bill - Household Impact Dashboard")
@@ -21,6 +35,7 @@ def main():
     
     # Load the data
     df = load_data()
+    interesting_options = compute_interesting_cases(df)
     
     # Sidebar for household selection
     st.sidebar.header("Select Household")
@@ -37,14 +52,6 @@ def main():
             df['Household ID'].unique()
         )
     else:
-        # Pre-filter for interesting cases
-        interesting_options = {
-            "Biggest Tax Increase": df.loc[df['Total Change in Federal Tax Liability'].idxmax(), 'Household ID'],
-            "Biggest Tax Decrease": df.loc[df['Total Change in Federal Tax Liability'].idxmin(), 'Household ID'],
-            "Highest Income Impact": df.loc[df['Total Change in Net Income'].abs().idxmax(), 'Household ID'],
-            "Largest Percentage Change": df.loc[df['Percentage Change in Federal Tax Liability'].abs().idxmax(), 'Household ID']
-        }
-        
         case_type = st.sidebar.selectbox("Select Case Type:", list(interesting_options.keys()))
         household_id = interesting_options[case_type]
         st.sidebar.info(f"Selected Household ID: {household_id}")
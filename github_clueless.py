@@ -1,7 +1,9 @@
+import os
+import threading
 import streamlit as st
 import pandas as pd
 import numpy as np
-import math
+import pyarrow as pa
 import plotly.graph_objects as go
 import random
 
@@ -12,27 +14,175 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load data
-@st.cache_data
-def load_data():
-    return pd.read_csv("retrial.csv")
+DATA_CSV = "retrial.csv"
+# Typed columnar copy of DATA_CSV, rebuilt whenever the CSV is newer
+DATA_PARQUET = "retrial.parquet"
 
-# Main app
-def main():
-    st.title("🏠 HR1 Tax Bill - Household Impact Dashboard")
-    st.markdown("*Explore how the HR1 tax bill affects individual American households compared to current policy*")
+def _downcast(df):
+    # float32/int32 halve the bytes scanned by every filter; State only has ~50 distinct values
+    float_cols = df.select_dtypes('float64').columns
+    df[float_cols] = df[float_cols].apply(pd.to_numeric, downcast='float')
+    df['State'] = df['State'].astype('category')
+    df['Household ID'] = df['Household ID'].astype('int32')
+    return df
+
+def _read_data():
+    if os.path.exists(DATA_PARQUET) and os.path.getmtime(DATA_PARQUET) >= os.path.getmtime(DATA_CSV):
+        try:
+            # Memory-map the file so Arrow reads column buffers without an extra copy
+            return pd.read_parquet(DATA_PARQUET, engine="pyarrow", memory_map=True)
+        except (OSError, pa.ArrowInvalid):
+            pass  # Truncated or unreadable copy: rebuild it from the CSV
+    df = pd.read_csv(DATA_CSV).pipe(_downcast)
+    # Write beside the final path and rename it into place, so a reader never sees a partial file.
+    # The temp name is per process and thread: sessions loading concurrently never share one.
+    tmp = f"{DATA_PARQUET}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        df.to_parquet(tmp, engine="pyarrow")
+        os.replace(tmp, DATA_PARQUET)
+    except OSError:
+        pass  # Read-only deploy: keep serving from the parsed CSV
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)  # Only left behind when the write or rename failed
+    return df
+
+DEP_COLS = [f'Age of Dependent {i}' for i in range(1, 12)]
+
+# Reform components shown in the breakdown: (display name, column suffix)
+REFORM_CONFIGS = [
+    ("Tax Rate Reform", "Tax Rate Reform"),
+    ("Standard Deduction Reform", "Standard Deduction Reform"),
+    ("Exemption Reform", "Exemption Reform"),
+    ("Child Tax Credit Reform", "CTC Reform"),
+    ("QBID Reform", "QBID Reform"),
+    # Removed Estate Tax Reform, because it doesn't directly affect Federal Income Tax, like the other reforms.
+    #("Estate Tax Reform", "Estate Tax Reform"),
+    ("AMT Reform", "AMT Reform"),
+    ("SALT Reform", "SALT Reform"),
+    ("Tip Income Exemption", "Tip Income Exempt"),
+    ("Overtime Income Exemption", "Overtime Income Exempt"),
+    ("Auto Loan Interest Deduction", "Auto Loan Interest ALD"),
+    ("Miscellaneous Reform", "Miscellaneous Reform"),
+    ("Other Itemized Deductions Reform", "Other Itemized Deductions Reform"),
+    ("Pease Reform", "Pease Reform")
+]
+REFORM_NAMES: tuple[str, ...] = tuple(name for name, _ in REFORM_CONFIGS)
+INC_COLS = [f'Net income change after {col}' for _, col in REFORM_CONFIGS]
+
+# Dollar fields shown as-is in the cards
+FORMAT_COLS = ['Baseline Federal Tax Liability', 'Baseline Net Income', 'Property Taxes', 'State Income Tax']
+
+# Plotly client config for the waterfall: no mode bar, resize with the container
+WATERFALL_CONFIG = {"staticPlot": False, "displayModeBar": False, "responsive": True}
+
+# Load data. Persisted to disk so worker restarts unpickle the prepared frame instead of
+# rebuilding it; csv_mtime is part of the cache key so an updated CSV invalidates it.
+# Only the current data version is kept (see _drop_stale_data).
+@st.cache_data(persist="disk", max_entries=1, show_spinner="Loading tax data…")
+def load_data(csv_mtime):
+    # Downcast again here so a Parquet copy written with an older schema is still typed,
+    # then index by Household ID so fetching a household is a hash lookup, not a column scan
+    df = _read_data().pipe(_downcast).set_index('Household ID', drop=False)
+    # Whole-household count each weight represents, rounded up once for the entire column
+    # Derived columns are underscore-prefixed and kept out of the "Full Dataframe Row" view
+    df['_ceil_weight'] = np.ceil(df['Household Weight'].to_numpy()).astype(np.int64)
+    # Story summary wording, graded for every household in one vectorized pass
+    chg = df['Total Change in Net Income'].to_numpy()
+    df['_impact_level'] = np.select([np.abs(chg) > 1000, np.abs(chg) > 100], ['significantly', 'moderately'], default='minimally')
+    df['_direction'] = np.where(chg > 0, 'benefits from', 'is burdened by')
+    # Display strings for the display-only fields, formatted once instead of on every rerun
+    for c in FORMAT_COLS:
+        df['_fmt_' + c] = df[c].map("${:,.2f}".format)
+    df['_fmt_ceil_weight'] = df['_ceil_weight'].map("{:,}".format)
+    pos_map = pd.Series(np.arange(len(df)), index=df.index)
+    col_idx = {name: i for i, name in enumerate(df.columns)}
+    return df, pos_map, col_idx
+
+# CSV mtime this process last served. max_entries only bounds the in-memory layer: Streamlit
+# never evicts persisted pickles, so on a CSV refresh the old version is cleared explicitly
+# before the new one is built (clearing from inside load_data would discard its own result).
+@st.cache_resource
+def _served_mtime():
+    return {"mtime": None}
+
+def _drop_stale_data(csv_mtime):
+    served = _served_mtime()
+    if served["mtime"] is not None and served["mtime"] != csv_mtime:
+        load_data.clear()
+    served["mtime"] = csv_mtime
+
+# One-row frame for the "Full Dataframe Row" expander, built once per household.
+# df is underscore-prefixed so only the household ID and the CSV mtime it was loaded from are hashed.
+@st.cache_data(max_entries=256)
+def household_row_frame(household_id, csv_mtime, _df):
+    return _df.loc[[household_id], ~_df.columns.str.startswith('_')]
+
+# Numeric core of the reform breakdown, one row per household: which components are active,
+# their tax effect (a net income gain is a tax cut), the waterfall running totals and the
+# column of the largest component
+def analyze_reforms(inc, baseline):
+    mask = np.abs(inc) > 0.01
+    changes = np.where(mask, -inc, np.float32(0))
+    running = baseline[:, None] + np.cumsum(changes, axis=1)
+    biggest = np.argmax(np.abs(changes), axis=1)
+    return mask, changes, running, biggest
+
+# Reform breakdown for every household, computed once and indexed by row position.
+# Each field is one contiguous (households x reforms) float32 array lined up with REFORM_NAMES.
+# cache_resource hands back the same arrays instead of unpickling a copy on each rerun;
+# keyed on csv_mtime so a reloaded frame gets fresh arrays and the old ones are evicted.
+@st.cache_resource(max_entries=1)
+def precompute_summaries(csv_mtime, _df):
+    inc = _df[INC_COLS].to_numpy(dtype=np.float32)
+    baseline = _df['Baseline Federal Tax Liability'].to_numpy(dtype=np.float32)
+    mask, changes, running, biggest = analyze_reforms(inc, baseline)
+    return {"inc": inc, "mask": mask, "changes": changes, "running": running, "biggest": biggest}
+
+# Federal income tax waterfall, built once per household and shared across sessions
+@st.cache_resource(max_entries=128)
+def build_waterfall(household_id, baseline_tax, names, tax_changes, final_tax):
+    # Create FEDERAL INCOME TAX waterfall chart (state option still needed, etc.)
+    fig = go.Figure() 
     
-    # Load the data
-    df = load_data()
+    # Add baseline
+    fig.add_trace(go.Waterfall(
+        name="Federal Income Tax Impact",
+        orientation="v",
+        measure=["absolute"] + ["relative"] * len(names) + ["total"],
+        x=["Baseline Federal Income Tax", *names, "Final Federal Income Tax"],
+        y=[baseline_tax, *tax_changes, final_tax],
+        text=[f"${value:,.0f}" for value in (baseline_tax, *tax_changes, final_tax)],
+        textposition="outside",
+        connector={"line":{"color":"rgb(63, 63, 63)"}},
+        increasing={"marker":{"color":"red"}},  # Tax increases in red
+        decreasing={"marker":{"color":"green"}},  # Tax decreases in green
+        totals={"marker":{"color":"blue"}}
+    ))
     
-    # Sidebar for household selection
-    st.sidebar.header("Select Household")
+    fig.update_layout(
+        title=f"Federal Income Tax Liability Changes: ${baseline_tax:,.0f} → ${final_tax:,.0f}",
+        xaxis_title="Reform Components",
+        yaxis_title="Tax Liability ($)",
+        showlegend=False,
+        height=500,
+        xaxis={'tickangle': -45},
+        uirevision="waterfall"  # Reuse the existing plot DOM when the figure is re-sent
+    )
+    return fig
+
+# Household selection: filters, selection method and the chosen household.
+# As a fragment it reruns on its own when these widgets change and only triggers a
+# full-app rerun when the selected household actually changes.
+@st.fragment
+def sidebar_selector(df):
+    st.header("Select Household")
     
-    # Initialize filtered dataframe
-    df_filtered = df.copy()
+    # Rows kept by the active filters, combined into one mask and applied once (no full-frame copy)
+    keep = np.ones(len(df), dtype=bool)
     
     ### ALL FILTERS
-    with st.sidebar.expander("🔍 Filters"):
+    with st.expander("🔍 Filters"):
         # Filter 1: Household Weight
         weight_options = {
             "All Households": 0,
@@ -45,7 +195,7 @@ def main():
         selected_weight = st.selectbox("Minimum Household Weight:", list(weight_options.keys()))  # Removed .sidebar
         min_weight = weight_options[selected_weight]
         if min_weight > 0:
-            df_filtered = df_filtered[df_filtered['Household Weight'] >= min_weight]
+            keep &= df['Household Weight'].to_numpy() >= min_weight
         
         # Filter 2: Net Income
         income_ranges = {
@@ -59,32 +209,30 @@ def main():
         selected_income = st.selectbox("Net Income:", list(income_ranges.keys()))  # Removed .sidebar
         min_income, max_income = income_ranges[selected_income]
         if min_income > 0 or max_income < float('inf'):
-            df_filtered = df_filtered[
-                (df_filtered['Baseline Net Income'] >= min_income) & 
-                (df_filtered['Baseline Net Income'] <= max_income)
-            ]
+            income = df['Baseline Net Income'].to_numpy()
+            keep &= (income >= min_income) & (income <= max_income)
         
         # Filter 3: State
         states = ["All States"] + sorted(df['State'].unique().tolist())
         selected_state = st.selectbox("State:", states)  # Removed .sidebar
         if selected_state != "All States":
-            df_filtered = df_filtered[df_filtered['State'] == selected_state]
+            keep &= (df['State'] == selected_state).to_numpy()
         
         # Filter 4: Marital Status
         marital_options = ["All", "Married", "Single"]
         selected_marital = st.selectbox("Marital Status:", marital_options)  # Removed .sidebar
         if selected_marital != "All":
             is_married = selected_marital == "Married"
-            df_filtered = df_filtered[df_filtered['Is Married'] == is_married]
+            keep &= df['Is Married'].to_numpy() == is_married
         
         # Filter 5: Number of Dependents
         dependent_options = ["All", "0", "1", "2", "3+"]
         selected_dependents = st.selectbox("Number of Dependents:", dependent_options)  # Removed .sidebar
         if selected_dependents != "All":
             if selected_dependents == "3+":
-                df_filtered = df_filtered[df_filtered['Number of Dependents'] >= 3]
+                keep &= df['Number of Dependents'].to_numpy() >= 3
             else:
-                df_filtered = df_filtered[df_filtered['Number of Dependents'] == int(selected_dependents)]
+                keep &= df['Number of Dependents'].to_numpy() == int(selected_dependents)
 
         # Filter 6: Age of Head of Household
         age_ranges = {
@@ -100,10 +248,10 @@ def main():
         selected_age = st.selectbox("Head of Household Age:", list(age_ranges.keys()))
         min_age, max_age = age_ranges[selected_age]
         if selected_age != "All Ages":
-            df_filtered = df_filtered[
-                (df_filtered['Age of Head'] >= min_age) & 
-                (df_filtered['Age of Head'] < max_age)
-            ]
+            age = df['Age of Head'].to_numpy()
+            keep &= (age >= min_age) & (age < max_age)
+        
+        df_filtered = df if keep.all() else df[keep]
         
         # Show filter results  
         st.caption(f"📊 Showing {len(df_filtered):,} of {len(df):,} households")  # Removed .sidebar
@@ -114,31 +262,36 @@ def main():
     # Use df_filtered everywhere below this point
 
     
-    selection_method = st.sidebar.radio(
+    selection_method = st.radio(
         "Selection Method:",
         ["By Household ID", "Find Interesting Cases", "Random Shuffle"]
     )
     
     if selection_method == "By Household ID":
-        household_id = st.sidebar.selectbox(
+        household_id = st.selectbox(
             "Choose Household ID:",
             df_filtered['Household ID'].unique()
         )
     
     elif selection_method == "Random Shuffle":
-        if st.sidebar.button("🎲 Get Random Household"):
+        # One generator per session; draw straight from the filtered index (the household IDs)
+        if 'rng' not in st.session_state:
+            st.session_state.rng = np.random.default_rng()
+        filtered_ids = df_filtered.index.to_numpy()
+        
+        if st.button("🎲 Get Random Household"):
             # Store random selection in session state to persist across reruns
-            st.session_state.random_household = df_filtered['Household ID'].sample(1).iloc[0]
+            st.session_state.random_household = int(st.session_state.rng.choice(filtered_ids))
         
         # Show the selected random household or pick initial one
         if 'random_household' not in st.session_state:
-            st.session_state.random_household = df_filtered['Household ID'].sample(1).iloc[0]
+            st.session_state.random_household = int(st.session_state.rng.choice(filtered_ids))
         
         household_id = st.session_state.random_household
-        st.sidebar.info(f"Random Household ID: {household_id}")
+        st.info(f"Random Household ID: {household_id}")
     else:
         # Pre-filter for interesting cases with top 20 rankings
-        case_type = st.sidebar.selectbox("Select Case Type:", [
+        case_type = st.selectbox("Select Case Type:", [
             "Largest % Federal Tax Increase",
             "Largest % Federal Tax Decrease", 
             "Largest Federal Tax Increase",
@@ -187,63 +340,79 @@ def main():
                     ranked_options.append(f"#{i}: ${value:+,.0f}")
         
         # Let user select from ranked list
-        selected_option = st.sidebar.selectbox(f"Top 20 for {case_type}:", ranked_options)
+        selected_option = st.selectbox(f"Top 20 for {case_type}:", ranked_options)
         
         # Get household ID using the index
         selected_index = ranked_options.index(selected_option)
         household_id = household_ids[selected_index]
         # Show it in a card
-        st.sidebar.info(f"Selected Household ID: {household_id}")
+        st.info(f"Selected Household ID: {household_id}")
+
+    # Hand the pick to the rest of the page; only a changed selection needs it redrawn
+    if 'hid' not in st.session_state:
+        st.session_state.hid = int(household_id)
+    elif st.session_state.hid != household_id:
+        st.session_state.hid = int(household_id)
+        st.rerun()
 
+# Main app
+def main():
+    st.title("🏠 HR1 Tax Bill - Household Impact Dashboard")
+    st.markdown("*Explore how the HR1 tax bill affects individual American households compared to current policy*")
     
+    # Load the data. Caches derived from the frame take csv_mtime too, so they invalidate with it.
+    csv_mtime = os.path.getmtime(DATA_CSV)
+    _drop_stale_data(csv_mtime)
+    df, pos_map, col_idx = load_data(csv_mtime)
     
-    # Get household data
-    household = df_filtered[df_filtered['Household ID'] == household_id].iloc[0]
+    # Sidebar for household selection (must be drawn inside the sidebar context to run as a fragment)
+    with st.sidebar:
+        sidebar_selector(df)
+    household_id = st.session_state.hid
+
+    # Get household data as a plain array; fields are read by their cached column position
+    row = df.loc[household_id].to_numpy()
 
     # Baseline Attributes in Sidebar
     st.sidebar.subheader("Baseline Household Attributes")
         
-    st.sidebar.markdown(f"""
-    **State:** {household['State']}  
-    **Head of Household Age:** {household['Age of Head']:.0f} years  
-    **Number of Dependents:** {household['Number of Dependents']:.0f}""")
+    # Build the whole attribute block first and send it as a single sidebar element
+    parts = [
+        f"**State:** {row[col_idx['State']]}  \n"
+        f"**Head of Household Age:** {row[col_idx['Age of Head']]:.0f} years  \n"
+        f"**Number of Dependents:** {row[col_idx['Number of Dependents']]:.0f}"
+    ]
     # Add children's ages if there are dependents
-    if household['Number of Dependents'] > 0:
-        dependent_ages = []
-        for i in range(1, 12):  # Check dependents 1-11
-            age_col = f'Age of Dependent {i}'
-            if pd.notna(household[age_col]) and household[age_col] > 0:
-                dependent_ages.append(f"{household[age_col]:.0f}")
+    if row[col_idx['Number of Dependents']] > 0:
+        ages = row[[col_idx[c] for c in DEP_COLS]].astype(float)
+        ages = ages[~np.isnan(ages) & (ages > 0)]
+        dependent_ages = [f"{a:.0f}" for a in ages]
         
         if dependent_ages:
-            st.sidebar.markdown(f"**Children's Ages:** {', '.join(dependent_ages)} years")
-    
+            parts.append(f"**Children's Ages:** {', '.join(dependent_ages)} years")
 
-    if household['Is Married']:
-        st.sidebar.markdown(f"""**Marital Status:** Married  
-    **Spouse Age:** {household['Age of Spouse']:.0f} years""")
+    if row[col_idx['Is Married']]:
+        parts.append(f"**Marital Status:** Married  \n**Spouse Age:** {row[col_idx['Age of Spouse']]:.0f} years")
     else:
-        st.sidebar.markdown("**Marital Status:** Single")
+        parts.append("**Marital Status:** Single")
 
-    st.sidebar.markdown("**Income Sources:**")
+    parts.append("**Income Sources:**")
     income_sources = [
-        ("Employment Income", household['Employment Income']),
-        ("Self-Employment Income", household['Self-Employment Income']),
-        ("Tip Income", household['Tip Income']),
-        ("Overtime Income", household['Overtime Income']),
-        ("Capital Gains", household['Capital Gains'])
+        ("Employment Income", row[col_idx['Employment Income']]),
+        ("Self-Employment Income", row[col_idx['Self-Employment Income']]),
+        ("Tip Income", row[col_idx['Tip Income']]),
+        ("Overtime Income", row[col_idx['Overtime Income']]),
+        ("Capital Gains", row[col_idx['Capital Gains']])
     ]
+    parts += [f"• {source}: ${amount:,.2f}" for source, amount in income_sources if amount > 0]
 
-    for source, amount in income_sources:
-        if amount > 0:
-            st.sidebar.markdown(f"• {source}: ${amount:,.2f}")
+    # Blank lines keep each entry its own paragraph, as the separate calls rendered them
+    st.sidebar.markdown("\n\n".join(parts))
 
 
     # Collapsible DF row
     with st.sidebar.expander("Full Dataframe Row"):
-        # Get the row index (position in the CSV)
-        row_index = df_filtered[df_filtered['Household ID'] == household_id].index[0]
-        st.dataframe(household.to_frame().T, use_container_width=True)
+        st.dataframe(household_row_frame(household_id, csv_mtime, df), use_container_width=True)
 
     
     # Display household information in cards
@@ -255,28 +424,28 @@ def main():
         with st.container():
             st.metric(
                 "Federal Tax Liability", 
-                f"${household['Baseline Federal Tax Liability']:,.2f}"
+                row[col_idx['_fmt_Baseline Federal Tax Liability']]
             )
             st.metric(
                 "Net Income", 
-                f"${household['Baseline Net Income']:,.2f}"
+                row[col_idx['_fmt_Baseline Net Income']]
             )
             
             # Show other current expenses
-            if household['State Income Tax'] > 0:
-                st.markdown(f"**State Income Tax:** ${household['State Income Tax']:,.2f}")    
-            if household['Property Taxes'] > 0:
-                st.markdown(f"**Property Taxes:** ${household['Property Taxes']:,.2f}")
+            if row[col_idx['State Income Tax']] > 0:
+                st.markdown(f"**State Income Tax:** {row[col_idx['_fmt_State Income Tax']]}")    
+            if row[col_idx['Property Taxes']] > 0:
+                st.markdown(f"**Property Taxes:** {row[col_idx['_fmt_Property Taxes']]}")
       
     
     with col2:
         # Reform Impact Card
         st.subheader("🔄 HR1 Bill Impact Summary")
         with st.container():
-            tax_change = household['Total Change in Federal Tax Liability']
-            income_change = household['Total Change in Net Income']
-            tax_pct_change = household['Percentage Change in Federal Tax Liability']
-            income_pct_change = household['Percentage Change in Net Income']
+            tax_change = row[col_idx['Total Change in Federal Tax Liability']]
+            income_change = row[col_idx['Total Change in Net Income']]
+            tax_pct_change = row[col_idx['Percentage Change in Federal Tax Liability']]
+            income_pct_change = row[col_idx['Percentage Change in Net Income']]
             
             # Color coding for positive/negative changes
             tax_color = "red" if tax_change > 0 else "green"
@@ -297,105 +466,60 @@ def main():
         # Statistical Weight Card
         st.subheader("📈 Statistical Weight")
         with st.container():
-            weight = household['Household Weight']
-            st.metric("Population Weight", f"{math.ceil(weight):,}")
+            weight_str = row[col_idx['_fmt_ceil_weight']]
+            st.metric("Population Weight", weight_str)
             st.caption("This household represents approximately this many similar households in the U.S.")
     
-    # Create reform components data
-    reform_components = [
-        ("Tax Rate Reform", household['Federal tax liability after Tax Rate Reform'], household['Net income change after Tax Rate Reform']),
-        ("Standard Deduction Reform", household['Federal tax liability after Standard Deduction Reform'], household['Net income change after Standard Deduction Reform']),
-        ("Exemption Reform", household['Federal tax liability after Exemption Reform'], household['Net income change after Exemption Reform']),
-        ("Child Tax Credit Reform", household['Federal tax liability after CTC Reform'], household['Net income change after CTC Reform']),
-        ("QBID Reform", household['Federal tax liability after QBID Reform'], household['Net income change after QBID Reform']),
-        # Removed Estate Tax Reform, because it doesn't directly affect Federal Income Tax, like the other reforms.
-        #("Estate Tax Reform", household['Federal tax liability after Estate Tax Reform'], household['Net income change after Estate Tax Reform']),
-        ("AMT Reform", household['Federal tax liability after AMT Reform'], household['Net income change after AMT Reform']),
-        ("SALT Reform", household['Federal tax liability after SALT Reform'], household['Net income change after SALT Reform']),
-        ("Tip Income Exemption", household['Federal tax liability after Tip Income Exempt'], household['Net income change after Tip Income Exempt']),
-        ("Overtime Income Exemption", household['Federal tax liability after Overtime Income Exempt'], household['Net income change after Overtime Income Exempt']),
-        ("Auto Loan Interest Deduction", household['Federal tax liability after Auto Loan Interest ALD'], household['Net income change after Auto Loan Interest ALD']),
-        ("Miscellaneous Reform", household['Federal tax liability after Miscellaneous Reform'], household['Net income change after Miscellaneous Reform']),
-        ("Other Itemized Deductions Reform", household['Federal tax liability after Other Itemized Deductions Reform'], household['Net income change after Other Itemized Deductions Reform']),
-        ("Pease Reform", household['Federal tax liability after Pease Reform'], household['Net income change after Pease Reform'])
-    ]
-    
-    # Filter out components with no change
-    active_components = [(name, tax_after, income_change) for name, tax_after, income_change in reform_components if abs(income_change) > 0.01]
+    # Look up this household's precomputed reform breakdown and keep the components that change net income
+    summaries = precompute_summaries(csv_mtime, df)
+    pos = pos_map.at[household_id]
+    active_idx = np.flatnonzero(summaries["mask"][pos])
+    active_names = [REFORM_NAMES[i] for i in active_idx]
+    active_inc = summaries["inc"][pos, active_idx]
+    tax_changes = summaries["changes"][pos, active_idx]
+    running_totals = summaries["running"][pos, active_idx]
+    baseline_tax = row[col_idx['Baseline Federal Tax Liability']]
 
     # Detailed Reform Breakdown
     st.subheader("🔍 Detailed Reform Component Analysis")
     
-    if active_components:
-        cols = st.columns(min(3, len(active_components)))
-        for i, (name, tax_after, income_change) in enumerate(active_components):
-            with cols[i % 3]:
-                color = "green" if income_change > 0 else "red"
-                st.markdown(f"""
-                <div style="padding: 8px; border-radius: 5px; background-color: #f9f9f9; margin: 5px 0;">
-                <h5>{name}</h5>
-                <p style="color: {color}; font-weight: bold;">
-                Net Income Change: ${income_change:,.2f} 
-                </p>
-                </div>
-                """, unsafe_allow_html=True)
+    if active_names:
+        # One table for every active component instead of a separate HTML card per reform
+        breakdown = pd.DataFrame({"Reform": active_names, "Net Income Change": active_inc})
+        st.dataframe(
+            breakdown.style
+                .format({"Net Income Change": "${:,.2f}"})
+                .map(lambda v: f"color: {'green' if v > 0 else 'red'}; font-weight: bold", subset=["Net Income Change"]),
+            hide_index=True,
+            use_container_width=True
+        )
                 
         # Waterfall Chart
         st.subheader("📊 Financial Impact Waterfall Chart")
         
-        # Prepare data for waterfall chart
-        baseline_tax = household['Baseline Federal Tax Liability']
-        
-        # Get tax liability changes (not net income changes)
-        waterfall_data = []
-        waterfall_data.append(("Baseline Federal Income Tax", baseline_tax, baseline_tax))
-        
-        running_total = baseline_tax
-        
-        for name, tax_after, income_change in active_components:
-            # Calculate the tax change (negative income change = positive tax change)
-            tax_change = -income_change
-            running_total += tax_change
-            waterfall_data.append((name, tax_change, running_total))
+        # Prepare data for waterfall chart, using tax liability changes (not net income changes)
+        waterfall_data = [("Baseline Federal Income Tax", baseline_tax, baseline_tax)]
+        waterfall_data += zip(active_names, tax_changes, running_totals)
         
         # Final total
-        final_tax = baseline_tax + household['Total Change in Federal Tax Liability']
+        final_tax = baseline_tax + row[col_idx['Total Change in Federal Tax Liability']]
         waterfall_data.append(("Final Federal Income Tax", final_tax, final_tax))
         
-        # Create FEDERAL INCOME TAX waterfall chart (state option still needed, etc.)
-        fig = go.Figure() 
-        
-        # Add baseline
-        fig.add_trace(go.Waterfall(
-            name="Federal Income Tax Impact",
-            orientation="v",
-            measure=["absolute"] + ["relative"] * len(active_components) + ["total"],
-            x=[item[0] for item in waterfall_data],
-            y=[item[1] for item in waterfall_data],
-            text=[f"${item[1]:,.0f}" for item in waterfall_data],
-            textposition="outside",
-            connector={"line":{"color":"rgb(63, 63, 63)"}},
-            increasing={"marker":{"color":"red"}},  # Tax increases in red
-            decreasing={"marker":{"color":"green"}},  # Tax decreases in green
-            totals={"marker":{"color":"blue"}}
-        ))
-        
-        fig.update_layout(
-            title=f"Federal Income Tax Liability Changes: ${baseline_tax:,.0f} → ${final_tax:,.0f}",
-            xaxis_title="Reform Components",
-            yaxis_title="Tax Liability ($)",
-            showlegend=False,
-            height=500,
-            xaxis={'tickangle': -45}
+        fig = build_waterfall(
+            household_id,
+            baseline_tax,
+            tuple(active_names),
+            tuple(tax_changes),
+            final_tax
         )
         
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig, use_container_width=True, config=WATERFALL_CONFIG)
         
         # Verification
         total_calculated_change = sum([item[1] for item in waterfall_data[1:-1]])
         # Changed this from taxes, to overall change from all reforms!! Must change title accordingly
         # And negated the change in income so it would match the change in taxes
-        actual_change = -household['Total Change in Net Income']
+        actual_change = -row[col_idx['Total Change in Net Income']]
 
         # Check if calculated change is within $3 of other Tax Change calculation
         if abs(total_calculated_change - actual_change) < 3:
@@ -408,26 +532,30 @@ def main():
     
     # Summary for journalists
     st.subheader("📝 Story Summary")
-    impact_level = "significantly" if abs(income_change) > 1000 else "moderately" if abs(income_change) > 100 else "minimally"
-    direction = "benefits from" if income_change > 0 else "is burdened by"
+    impact_level = row[col_idx['_impact_level']]
+    direction = row[col_idx['_direction']]
 
     
     # Find the reform with the greatest absolute impact
-    if active_components:
-        biggest_impact_reform = max(active_components, key=lambda x: abs(x[2]))
-        biggest_reform_name = biggest_impact_reform[0]
-        biggest_reform_change = biggest_impact_reform[2]
+    if active_names:
+        biggest = summaries["biggest"][pos]
+        biggest_reform_name = REFORM_NAMES[biggest]
+        biggest_reform_change = summaries["inc"][pos, biggest]
         biggest_reform_text = f"The biggest change comes from the {biggest_reform_name} (${biggest_reform_change:+,.2f})."
     else:
         biggest_reform_text = "No single reform has a major impact."
 
     
     st.info(f"""
-    **Quick Story Angle:** This {household['State']} household {impact_level} {direction} the HR1 bill, 
-    with a net income change of {household['Total Change in Net Income']:,.2f} ({income_pct_change:+.1f}%). 
+    **Quick Story Angle:** This {row[col_idx['State']]} household {impact_level} {direction} the HR1 bill, 
+    with a net income change of {row[col_idx['Total Change in Net Income']]:,.2f} ({income_pct_change:+.1f}%). 
     {biggest_reform_text}
-    The household represents approximately {f"{math.ceil(weight):,}"} similar American families.
+    The household represents approximately {weight_str} similar American families.
     """)
     
 if __name__ == "__main__":
-    main()
+    if st.runtime.exists():
+        main()
+    else:
+        # Run with plain `python` at deploy time to write the Parquet copy ahead of the first visitor
+        load_data(os.path.getmtime(DATA_CSV))
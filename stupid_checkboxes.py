@@ -1,7 +1,9 @@
+import os
+import threading
 import streamlit as st
 import pandas as pd
 import numpy as np
-import math
+import pyarrow as pa
 import plotly.graph_objects as go
 import random
 
@@ -12,249 +14,343 @@ st.set_page_config(
     layout="wide"
 )
 
+DATA_CSV = "retrial.csv"
+# Typed Feather copy of DATA_CSV, rebuilt whenever the CSV is newer
+DATA_FEATHER = "retrial.feather"
+
+# Explicit column types; the remaining dollar, age and percentage columns are narrowed in _apply_schema
+SCHEMA = {
+    'State': 'category',
+    'Is Married': 'bool',
+    'Age of Head': 'int8',
+    'Number of Dependents': 'int8',
+    'Household Weight': 'float32'
+}
+DEP_COLS = [f'Age of Dependent {i}' for i in range(1, 12)]  # Dependents 1-11
+MONEY_COLS = [
+    'Employment Income', 'Self-Employment Income', 'Capital Gains', 'Property Taxes', 'State Income Tax',
+    'Tip Income', 'Overtime Income', 'Auto Loan Interest', 'Baseline Federal Tax Liability', 'Baseline Net Income'
+]
+
+def _apply_schema(df):
+    for col, dtype in SCHEMA.items():
+        if dtype.startswith('int'):
+            # Weighted counts carry float noise in the CSV (e.g. 5.999999999999999)
+            df[col] = df[col].round()
+        df[col] = df[col].astype(dtype)
+    # Baseline amounts plus every per-reform and total change column. pandas only downcasts a column
+    # when float32 stays within ~5e-4 of every value, so the displayed cents survive; others stay float64.
+    money = [c for c in df.columns if c in MONEY_COLS or ' after ' in c or c.startswith('Total Change in ')]
+    df[money] = df[money].apply(pd.to_numeric, downcast='float')
+    # Ages and percentage changes are shown to a whole year / 0.1%, so float32 is always enough for them
+    approx = ['Age of Spouse', *DEP_COLS] + [c for c in df.columns if c.startswith('Percentage Change in ')]
+    df[approx] = df[approx].astype('float32')
+    return df
+
+# (display name, column suffix) for each reform component
+REFORM_CONFIGS = [
+    ("Tax Rate Reform", "Tax Rate Reform"),
+    ("Standard Deduction Reform", "Standard Deduction Reform"),
+    ("Exemption Reform", "Exemption Reform"),
+    ("Child Tax Credit Reform", "CTC Reform"),
+    ("QBID Reform", "QBID Reform"),
+    ("AMT Reform", "AMT Reform"),
+    ("SALT Reform", "SALT Reform"),
+    ("Tip Income Exemption", "Tip Income Exempt"),
+    ("Overtime Income Exemption", "Overtime Income Exempt"),
+    ("Auto Loan Interest Deduction", "Auto Loan Interest ALD"),
+    ("Miscellaneous Reform", "Miscellaneous Reform"),
+    ("Other Itemized Deductions Reform", "Other Itemized Deductions Reform"),
+    ("Pease Reform", "Pease Reform")
+]
+REFORM_NAMES = [display_name for display_name, _ in REFORM_CONFIGS]
+
+# "Find Interesting Cases" types: (ranking method, column ranked)
+CASE_CATEGORIES = {
+    "Largest % Federal Tax Increase": ('nlargest', 'Percentage Change in Federal Tax Liability'),
+    "Largest % Federal Tax Decrease": ('nsmallest', 'Percentage Change in Federal Tax Liability'),
+    "Largest Federal Tax Increase": ('nlargest', 'Total Change in Federal Tax Liability'),
+    "Largest Federal Tax Decrease": ('nsmallest', 'Total Change in Federal Tax Liability'),
+    "Largest % Income Increase": ('nlargest', 'Percentage Change in Net Income'),
+    "Largest % Income Decrease": ('nsmallest', 'Percentage Change in Net Income'),
+    "Largest Income Increase": ('nlargest', 'Total Change in Net Income'),
+    "Largest Income Decrease": ('nsmallest', 'Total Change in Net Income')
+}
+
+# Plotly client config for the waterfall: no mode bar, resize with the container
+WATERFALL_CONFIG = {"staticPlot": False, "displayModeBar": False, "responsive": True}
+
+# Sidebar filter options
+WEIGHT_OPTIONS = {
+    "All Households": 0,
+    "Weight 1,000+": 1000,
+    "Weight 5,000+": 5000,
+    "Weight 10,000+": 10000,
+    "Weight 25,000+": 25000,
+    "Weight 50,000+": 50000
+}
+INCOME_RANGES = {
+    "All Income Levels": (0, float('inf')),
+    "Under $25k": (0, 25000),
+    "$25k - $50k": (25000, 50000),
+    "$50k - $100k": (50000, 100000),
+    "$100k - $200k": (100000, 200000),
+    "$200k+": (200000, float('inf'))
+}
+DEPENDENT_OPTIONS = ["All", "0", "1", "2", "3+"]
+AGE_RANGES = {
+    "All Ages": (0, 200),
+    "Under 30": (0, 30),
+    "30-40": (30, 40),
+    "40-50": (40, 50),
+    "50-60": (50, 60),
+    "60-70": (60, 70),
+    "70-80": (70, 80),
+    "80+": (80, 200)
+}
+
+# Write beside DATA_FEATHER and rename it into place, so a reader never sees a partial file.
+# The temp name is per process and thread: sessions loading concurrently never share one.
+def _write_feather(df):
+    tmp = f"{DATA_FEATHER}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        df.to_feather(tmp)
+        os.replace(tmp, DATA_FEATHER)
+    except OSError:
+        pass  # Read-only deploy: keep serving the frame already in memory
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)  # Only left behind when the write or rename failed
+
 # Load data
 @st.cache_data
 def load_data():
-    return pd.read_csv("retrial.csv")
+    df = None
+    if os.path.exists(DATA_FEATHER) and os.path.getmtime(DATA_FEATHER) >= os.path.getmtime(DATA_CSV):
+        try:
+            df = pd.read_feather(DATA_FEATHER)
+        except (OSError, pa.ArrowInvalid):
+            pass  # Truncated or unreadable copy: rebuild it from the CSV
+    if df is not None:
+        # Apply the schema again so a Feather copy written by an older _apply_schema is still typed,
+        # and rewrite it once if that changed any dtype so the next cold start reads it ready-made
+        stored_dtypes = df.dtypes.copy()
+        df = df.pipe(_apply_schema)
+        if not df.dtypes.equals(stored_dtypes):
+            _write_feather(df)
+    else:
+        # pyarrow parses multi-threaded and round-trips floats exactly; dtypes stay NumPy
+        df = pd.read_csv(DATA_CSV, engine="pyarrow").pipe(_apply_schema)
+        _write_feather(df)
+    # Index by Household ID (kept as a column too) so a household is a hash lookup, not a column scan
+    df = df.set_index('Household ID', drop=False).sort_index()
+    # Whole households represented, for the weight card and the story (underscore columns are derived, not data)
+    df['_weight_ceil'] = np.ceil(df['Household Weight'].to_numpy()).astype(np.int64)
+    # Sidebar baseline attributes, formatted once for every household
+    df['_baseline_md'] = (
+        '**State:** ' + df['State'].astype(str)
+        + '  \n**Head of Household Age:** ' + df['Age of Head'].astype(str) + ' years'
+        + '  \n**Number of Dependents:** ' + df['Number of Dependents'].astype(str)
+    )
+    # State filter options; State is categorical, so this skips a full-column unique + sort per rerun
+    states = ["All States"] + sorted(df['State'].cat.categories.tolist())
+    return df, states
 
-# Main app
-def main():
-    st.title("🏠 HR1 Tax Bill - Household Impact Dashboard")
-    st.markdown("*Explore how the HR1 tax bill affects individual American households compared to current policy*")
-    
-    # Load the data
-    df = load_data()
-    
-    # Sidebar for household selection
-    st.sidebar.header("Select Household")
-    
-    # Initialize filtered dataframe
-    df_filtered = df.copy()
-    
-    ### ALL FILTERS
-    with st.sidebar.expander("🔍 Filters"):
-        # Filter 1: Household Weight
-        weight_options = {
-            "All Households": 0,
-            "Weight 1,000+": 1000,
-            "Weight 5,000+": 5000,
-            "Weight 10,000+": 10000,
-            "Weight 25,000+": 25000,
-            "Weight 50,000+": 50000
-        }
-        selected_weight = st.selectbox("Minimum Household Weight:", list(weight_options.keys()))  # Removed .sidebar
-        min_weight = weight_options[selected_weight]
-        if min_weight > 0:
-            df_filtered = df_filtered[df_filtered['Household Weight'] >= min_weight]
-        
-        # Filter 2: Net Income
-        income_ranges = {
-            "All Income Levels": (0, float('inf')),
-            "Under $25k": (0, 25000),
-            "$25k - $50k": (25000, 50000),
-            "$50k - $100k": (50000, 100000),
-            "$100k - $200k": (100000, 200000),
-            "$200k+": (200000, float('inf'))
-        }
-        selected_income = st.selectbox("Net Income:", list(income_ranges.keys()))  # Removed .sidebar
-        min_income, max_income = income_ranges[selected_income]
-        if min_income > 0 or max_income < float('inf'):
-            df_filtered = df_filtered[
-                (df_filtered['Baseline Net Income'] >= min_income) & 
-                (df_filtered['Baseline Net Income'] <= max_income)
-            ]
-        
-        # Filter 3: State
-        states = ["All States"] + sorted(df['State'].unique().tolist())
-        selected_state = st.selectbox("State:", states)  # Removed .sidebar
-        if selected_state != "All States":
-            df_filtered = df_filtered[df_filtered['State'] == selected_state]
-        
-        # Filter 4: Marital Status
-        marital_options = ["All", "Married", "Single"]
-        selected_marital = st.selectbox("Marital Status:", marital_options)  # Removed .sidebar
-        if selected_marital != "All":
-            is_married = selected_marital == "Married"
-            df_filtered = df_filtered[df_filtered['Is Married'] == is_married]
-        
-        # Filter 5: Number of Dependents
-        dependent_options = ["All", "0", "1", "2", "3+"]
-        selected_dependents = st.selectbox("Number of Dependents:", dependent_options)  # Removed .sidebar
-        if selected_dependents != "All":
-            if selected_dependents == "3+":
-                df_filtered = df_filtered[df_filtered['Number of Dependents'] >= 3]
-            else:
-                df_filtered = df_filtered[df_filtered['Number of Dependents'] == int(selected_dependents)]
+# Per-reform tax columns flattened to (households, reforms) matrices in REFORM_CONFIGS order,
+# so a household's 13 components are one row slice instead of 39 label lookups. float64 because
+# _apply_schema leaves most of these dollar columns float64: float32 would shift cents.
+@st.cache_resource
+def build_reform_matrices(_df):
+    def matrix(prefix):
+        return _df[[f'{prefix} {col_name}' for _, col_name in REFORM_CONFIGS]].to_numpy(dtype=np.float64)
+    return {
+        'federal_after': matrix('Federal tax liability after'),
+        'state_after': matrix('State tax liability after')
+    }
 
-        # Filter 6: Age of Head of Household
-        age_ranges = {
-            "All Ages": (0, 200),
-            "Under 30": (0, 30),
-            "30-40": (30, 40),
-            "40-50": (40, 50),
-            "50-60": (50, 60),
-            "60-70": (60, 70),
-            "70-80": (70, 80),
-            "80+": (80, 200)
+# Row positions matching every filter option, built once. A rerun then intersects the
+# position arrays of the selected options instead of re-masking the whole frame per filter.
+@st.cache_resource
+def build_filter_index(_df):
+    weight = _df['Household Weight'].to_numpy()
+    income = _df['Baseline Net Income'].to_numpy()
+    married = _df['Is Married'].to_numpy()
+    dependents = _df['Number of Dependents'].to_numpy()
+    age = _df['Age of Head'].to_numpy()
+    return {
+        'weight': {label: np.flatnonzero(weight >= w) for label, w in WEIGHT_OPTIONS.items() if w > 0},
+        'income': {
+            label: np.flatnonzero((income >= lo) & (income <= hi))
+            for label, (lo, hi) in INCOME_RANGES.items() if lo > 0 or hi < float('inf')
+        },
+        'state': _df.groupby('State', observed=True).indices,
+        'marital': {"Married": np.flatnonzero(married), "Single": np.flatnonzero(~married)},
+        'dependents': {
+            label: np.flatnonzero(dependents >= 3 if label == "3+" else dependents == int(label))
+            for label in DEPENDENT_OPTIONS if label != "All"
+        },
+        'age': {
+            label: np.flatnonzero((age >= lo) & (age < hi))
+            for label, (lo, hi) in AGE_RANGES.items() if label != "All Ages"
         }
-        selected_age = st.selectbox("Head of Household Age:", list(age_ranges.keys()))
-        min_age, max_age = age_ranges[selected_age]
-        if selected_age != "All Ages":
-            df_filtered = df_filtered[
-                (df_filtered['Age of Head'] >= min_age) & 
-                (df_filtered['Age of Head'] < max_age)
-            ]
-        
-        # Show filter results  
-        st.caption(f"📊 Showing {len(df_filtered):,} of {len(df):,} households")  # Removed .sidebar
-        if len(df_filtered) == 0:
-            st.error("No households match your filters!")  # Removed .sidebar
-            st.stop()
+    }
 
-    # Use df_filtered everywhere below this point
+# Rows present in every sorted position array. The smallest array is probed against the others
+# with searchsorted, so the work shrinks with the most selective filter and nothing is re-sorted.
+def intersect_positions(arrays):
+    arrays = sorted(arrays, key=len)
+    result = arrays[0]
+    for other in arrays[1:]:
+        hits = np.minimum(np.searchsorted(other, result), len(other) - 1)
+        result = result[other[hits] == result]
+    return result
+
+# Positions of the k largest/smallest values of column, best first, like nlargest/nsmallest.
+# argpartition is O(N); only the k survivors get sorted.
+def top_positions(df, column, largest, k=20):
+    values = df[column].to_numpy()
+    if largest:
+        values = -values
+    candidates = np.flatnonzero(~np.isnan(values))  # nlargest/nsmallest skip NaN
+    if len(candidates) > k:
+        vals = values[candidates]
+        cutoff = vals[np.argpartition(vals, k - 1)[k - 1]]
+        below = candidates[vals < cutoff]
+        ties = candidates[vals == cutoff][:k - len(below)]  # earliest rows win ties, as with keep='first'
+        candidates = np.sort(np.concatenate([below, ties]))
+    return candidates[np.argsort(values[candidates], kind='stable')]
 
+# (ranked_options, household_ids) of the top 20 for every case type, computed together once per
+# filter selection so switching case type is a dict lookup. filter_key identifies _df in the cache.
+@st.cache_data(max_entries=64)
+def top20_lookup(_df, filter_key):
+    rankings = {}
+    for case_type, (method, column) in CASE_CATEGORIES.items():
+        top_households = _df.iloc[top_positions(_df, column, method == 'nlargest')]
+        values = top_households[column].to_numpy()
+        household_ids = top_households['Household ID'].tolist()  # Keep track of household IDs separately
+        if "%" in case_type:
+            ranked_options = [f"#{i}: {value:+.1f}%" for i, value in enumerate(values, 1)]
+        else:  # Dollar amounts
+            ranked_options = [f"#{i}: ${value:+,.0f}" for i, value in enumerate(values, 1)]
+        rankings[case_type] = (ranked_options, household_ids)
+    return rankings
+
+# The waterfall figure for one household and tax selection. The chart data follows from the
+# key, so it is passed unhashed; cache_resource hands back the figure without copying it.
+@st.cache_resource(max_entries=128)
+def build_waterfall(household_id, show_federal, show_state, chart_type, _waterfall_data, _baseline, _final_total):
+    # Create FEDERAL INCOME TAX waterfall chart (state option still needed, etc.)
+    labels, values, _ = zip(*_waterfall_data)  # One pass over the rows for names and bar values
+    fig = go.Figure() 
     
-    selection_method = st.sidebar.radio(
-        "Selection Method:",
-        ["By Household ID", "Find Interesting Cases", "Random Shuffle"]
+    # Add baseline
+    fig.add_trace(go.Waterfall(
+        name=f"{chart_type} Impact",  # Dynamic name based on selection
+        orientation="v",
+        measure=["absolute"] + ["relative"] * (len(_waterfall_data) - 2) + ["total"],
+        x=list(labels),
+        y=list(values),
+        text=[f"${value:,.0f}" for value in values],
+        textposition="outside",
+        connector={"line":{"color":"rgb(63, 63, 63)"}},
+        increasing={"marker":{"color":"red"}},  # Tax increases in red
+        decreasing={"marker":{"color":"green"}},  # Tax decreases in green
+        totals={"marker":{"color":"blue"}}
+    ))
+    
+    # Update chart title
+    fig.update_layout(
+        title=f"{chart_type} Liability Changes: ${_baseline:,.0f} → ${_final_total:,.0f}",
+        xaxis_title="Reform Components",
+        yaxis_title="Tax Liability ($)",
+        showlegend=False,
+        height=500,
+        xaxis={'tickangle': -45},
+        uirevision="waterfall"  # Reuse the existing plot DOM when the figure is re-sent
     )
+    return fig
+
+# Everything below the impact cards that depends only on the household and the tax checkboxes:
+# (active_components, biggest_reform_text, waterfall_data, chart_type). row_idx identifies the
+# household, so _df stays out of the cache key and reruns for other widgets skip this work.
+@st.cache_data(max_entries=256)
+def analyze_household(row_idx, show_federal, show_state, _df):
+    reform_matrices = build_reform_matrices(_df)
+    federal_after = reform_matrices['federal_after'][row_idx]
+    state_after = reform_matrices['state_after'][row_idx]
+    federal_baseline = _df['Baseline Federal Tax Liability'].iat[row_idx]
+    state_baseline = _df['State Income Tax'].iat[row_idx]  # Using current state tax as baseline
     
-    if selection_method == "By Household ID":
-        household_id = st.sidebar.selectbox(
-            "Choose Household ID:",
-            df_filtered['Household ID'].unique()
+    # Selected tax types as (label, tax after each reform, change from baseline)
+    shown = [
+        (kind, after, after - baseline)
+        for kind, after, baseline, selected in (
+            ("Federal", federal_after, federal_baseline, show_federal),
+            ("State", state_after, state_baseline, show_state)
         )
+        if selected
+    ]
+    kinds = [kind for kind, _, _ in shown]
+    # Flattened reform-major: each reform's Federal component, then its State component
+    tax_after = np.column_stack([after for _, after, _ in shown]).ravel()
+    tax_changes = np.column_stack([changes for _, _, changes in shown]).ravel()
     
-    elif selection_method == "Random Shuffle":
-        if st.sidebar.button("🎲 Get Random Household"):
-            # Store random selection in session state to persist across reruns
-            st.session_state.random_household = df_filtered['Household ID'].sample(1).iloc[0]
-        
-        # Show the selected random household or pick initial one
-        if 'random_household' not in st.session_state:
-            st.session_state.random_household = df_filtered['Household ID'].sample(1).iloc[0]
-        
-        household_id = st.session_state.random_household
-        st.sidebar.info(f"Random Household ID: {household_id}")
-    else:
-        # Pre-filter for interesting cases with top 20 rankings
-        case_type = st.sidebar.selectbox("Select Case Type:", [
-            "Largest % Federal Tax Increase",
-            "Largest % Federal Tax Decrease", 
-            "Largest Federal Tax Increase",
-            "Largest Federal Tax Decrease",
-            "Largest % Income Increase",
-            "Largest % Income Decrease",
-            "Largest Income Increase",
-            "Largest Income Decrease"
-        ])
-        
-        # Get top 20 households for selected category
-        categories = {
-            "Largest % Federal Tax Increase": ('nlargest', 'Percentage Change in Federal Tax Liability'),
-            "Largest % Federal Tax Decrease": ('nsmallest', 'Percentage Change in Federal Tax Liability'),
-            "Largest Federal Tax Increase": ('nlargest', 'Total Change in Federal Tax Liability'),
-            "Largest Federal Tax Decrease": ('nsmallest', 'Total Change in Federal Tax Liability'),
-            "Largest % Income Increase": ('nlargest', 'Percentage Change in Net Income'),
-            "Largest % Income Decrease": ('nsmallest', 'Percentage Change in Net Income'),
-            "Largest Income Increase": ('nlargest', 'Total Change in Net Income'),
-            "Largest Income Decrease": ('nsmallest', 'Total Change in Net Income')
-        }
-        
-        method, column = categories[case_type]
-        top_households = getattr(df_filtered, method)(20, column)
-                
-        # Create ranked list for selection
-        ranked_options = []
-        household_ids = []  # Keep track of household IDs separately, sorry that this is not concise
-        
-        for i, (idx, row) in enumerate(top_households.iterrows(), 1):
-            household_ids.append(row['Household ID'])  # Store the household ID
-            
-            if "%" in case_type:
-                if "Tax" in case_type:
-                    value = row['Percentage Change in Federal Tax Liability']
-                    ranked_options.append(f"#{i}: {value:+.1f}%")
-                else:  # Income
-                    value = row['Percentage Change in Net Income']
-                    ranked_options.append(f"#{i}: {value:+.1f}%")
-            else:  # Dollar amounts
-                if "Tax" in case_type:
-                    value = row['Total Change in Federal Tax Liability']
-                    ranked_options.append(f"#{i}: ${value:+,.0f}")
-                else:  # Income
-                    value = row['Total Change in Net Income']
-                    ranked_options.append(f"#{i}: ${value:+,.0f}")
-        
-        # Let user select from ranked list
-        selected_option = st.sidebar.selectbox(f"Top 20 for {case_type}:", ranked_options)
-        
-        # Get household ID using the index
-        selected_index = ranked_options.index(selected_option)
-        household_id = household_ids[selected_index]
-        # Show it in a card
-        st.sidebar.info(f"Selected Household ID: {household_id}")
-
+    # Filter out components with no change
+    active_idx = np.flatnonzero(np.abs(tax_changes) > 0.01)
+    active_components = [
+        (f"{REFORM_NAMES[i // len(kinds)]} ({kinds[i % len(kinds)]})", tax_after[i], tax_changes[i])
+        for i in active_idx
+    ]
     
+    chart_title = []
+    if show_federal: chart_title.append("Federal")
+    if show_state: chart_title.append("State")
+    chart_type = " & ".join(chart_title) + " Tax"
     
-    # Get household data
-    household = df_filtered[df_filtered['Household ID'] == household_id].iloc[0]
-
-    # Baseline Attributes in Sidebar
-    st.sidebar.subheader("Baseline Household Attributes")
-        
-    st.sidebar.markdown(f"""
-    **State:** {household['State']}  
-    **Head of Household Age:** {household['Age of Head']:.0f} years  
-    **Number of Dependents:** {household['Number of Dependents']:.0f}""")
-    # Add children's ages if there are dependents
-    if household['Number of Dependents'] > 0:
-        dependent_ages = []
-        for i in range(1, 12):  # Check dependents 1-11
-            age_col = f'Age of Dependent {i}'
-            if pd.notna(household[age_col]) and household[age_col] > 0:
-                dependent_ages.append(f"{household[age_col]:.0f}")
-        
-        if dependent_ages:
-            st.sidebar.markdown(f"**Children's Ages:** {', '.join(dependent_ages)} years")
+    if not active_components:
+        return active_components, "No single reform has a major impact.", [], chart_type
     
+    # Find the reform with the greatest absolute impact
+    biggest_reform_name, _, biggest_reform_change = max(active_components, key=lambda x: abs(x[2]))
+    biggest_reform_text = f"The biggest change comes from the {biggest_reform_name} (${biggest_reform_change:+,.2f})."
+    
+    # Calculate baseline
+    baseline = (federal_baseline if show_federal else 0) + (state_baseline if show_state else 0)
+    total_tax_change = (
+        (_df['Total Change in Federal Tax Liability'].iat[row_idx] if show_federal else 0)
+        + (_df['Total Change in State Tax Liability'].iat[row_idx] if show_state else 0)
+    )
+    
+    # Prepare waterfall data - now using the tax_change directly
+    waterfall_data = [(f"Baseline {chart_type}", baseline, baseline)]
+    running_total = baseline
+    
+    for name, tax_after, tax_change in active_components:  # Now using tax_change directly
+        running_total += tax_change
+        waterfall_data.append((name, tax_change, running_total))
+    
+    # Final total
+    final_total = baseline + total_tax_change
+    waterfall_data.append((f"Final {chart_type}", final_total, final_total))
+    return active_components, biggest_reform_text, waterfall_data, chart_type
 
-    if household['Is Married']:
-        st.sidebar.markdown(f"""**Marital Status:** Married  
-    **Spouse Age:** {household['Age of Spouse']:.0f} years""")
-    else:
-        st.sidebar.markdown("**Marital Status:** Single")
-
-    st.sidebar.markdown("**Income Sources:**")
-    income_sources = [
-        ("Employment Income", household['Employment Income']),
-        ("Self-Employment Income", household['Self-Employment Income']),
-        ("Tip Income", household['Tip Income']),
-        ("Overtime Income", household['Overtime Income']),
-        ("Capital Gains", household['Capital Gains'])
-    ]
-
-    for source, amount in income_sources:
-        if amount > 0:
-            st.sidebar.markdown(f"• {source}: ${amount:,.2f}")
-
-
-    # Collapsible DF row
-    with st.sidebar.expander("Full Dataframe Row"):
-        # Get the row index (position in the CSV)
-        row_index = df_filtered[df_filtered['Household ID'] == household_id].index[0]
-        st.dataframe(household.to_frame().T, use_container_width=True)
-
+# Tax-type checkboxes and everything that depends on them. As a fragment, flipping a
+# checkbox reruns only this block, not the filters, rankings and sidebar above it.
+@st.fragment
+def impact_block(df, household_id):
+    household = df.loc[household_id]
 
     # Implementing the Federal vs. State Tax Checkboxes
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("Show Effects for")
-    show_federal = st.sidebar.checkbox("Federal Taxes", value=True)
-    show_state = st.sidebar.checkbox("State Taxes", value=False)
+    # In the page rather than the sidebar: a fragment may only write to its own container
+    st.subheader("Show Effects for")
+    federal_col, state_col = st.columns(2)
+    show_federal = federal_col.checkbox("Federal Taxes", value=True)
+    show_state = state_col.checkbox("State Taxes", value=False)
 
     if not show_federal and not show_state:
-        st.sidebar.error("Please select at least one tax type")
-        st.stop()
+        st.error("Please select at least one tax type")
+        return
     
     # Display household information in cards
     col1, col2 = st.columns(2)
@@ -323,120 +419,43 @@ def main():
         # Statistical Weight Card
         st.subheader("📈 Statistical Weight")
         with st.container():
-            weight = household['Household Weight']
-            st.metric("Population Weight", f"{math.ceil(weight):,}")
+            weight_ceil = int(household['_weight_ceil'])
+            st.metric("Population Weight", f"{weight_ceil:,}")
             st.caption("This household represents approximately this many similar households in the U.S.")
     
-    # Create reform components data based on selection
-    reform_configs = [
-        ("Tax Rate Reform", "Tax Rate Reform"),
-        ("Standard Deduction Reform", "Standard Deduction Reform"),
-        ("Exemption Reform", "Exemption Reform"),
-        ("Child Tax Credit Reform", "CTC Reform"),
-        ("QBID Reform", "QBID Reform"),
-        ("AMT Reform", "AMT Reform"),
-        ("SALT Reform", "SALT Reform"),
-        ("Tip Income Exemption", "Tip Income Exempt"),
-        ("Overtime Income Exemption", "Overtime Income Exempt"),
-        ("Auto Loan Interest Deduction", "Auto Loan Interest ALD"),
-        ("Miscellaneous Reform", "Miscellaneous Reform"),
-        ("Other Itemized Deductions Reform", "Other Itemized Deductions Reform"),
-        ("Pease Reform", "Pease Reform")
-    ]
-    
-    reform_components = []
-    
-    for display_name, col_name in reform_configs:
-        # Add Federal component if selected
-        if show_federal:
-            federal_tax_after = household[f'Federal tax liability after {col_name}']
-            federal_baseline = household['Baseline Federal Tax Liability']
-            federal_tax_change = federal_tax_after - federal_baseline
-            reform_components.append((f"{display_name} (Federal)", federal_tax_after, federal_tax_change))
-        
-        # Add State component if selected
-        if show_state:
-            state_tax_after = household[f'State tax liability after {col_name}']
-            state_baseline = household.get('State Income Tax', 0)  # Using current state tax as baseline
-            state_tax_change = state_tax_after - state_baseline
-            reform_components.append((f"{display_name} (State)", state_tax_after, state_tax_change))
-    
-    # Filter out components with no change
-    active_components = [(name, tax_after, tax_change) for name, tax_after, tax_change in reform_components if abs(tax_change) > 0.01]
+    # Reform components, waterfall rows and the biggest-impact sentence for this household
+    row = df.index.get_loc(household_id)  # Position of the household in df
+    active_components, biggest_reform_text, waterfall_data, chart_type = analyze_household(row, show_federal, show_state, df)
 
     # Detailed Reform Breakdown
     st.subheader("🔍 Detailed Reform Component Analysis")
     
     if active_components:
-        cols = st.columns(min(3, len(active_components)))
-        for i, (name, tax_after, tax_change) in enumerate(active_components):  # Changed from income_change to tax_change
-            with cols[i % 3]:
-                # For tax liability: negative change = tax decrease (good), positive change = tax increase (bad)
-                color = "green" if tax_change < 0 else "red"  # Reversed logic for tax liability
-                st.markdown(f"""
-                <div style="padding: 8px; border-radius: 5px; background-color: #f9f9f9; margin: 5px 0;">
-                <h5>{name}</h5>
-                <p style="color: {color}; font-weight: bold;">
-                Tax Change: ${tax_change:,.2f} 
-                </p>
-                </div>
-                """, unsafe_allow_html=True)
+        # All cards go out in one st.markdown; a CSS grid gives the same 3-wide layout as st.columns
+        cards = []
+        for name, tax_after, tax_change in active_components:  # Changed from income_change to tax_change
+            # For tax liability: negative change = tax decrease (good), positive change = tax increase (bad)
+            color = "green" if tax_change < 0 else "red"  # Reversed logic for tax liability
+            cards.append(
+                f'<div style="padding: 8px; border-radius: 5px; background-color: #f9f9f9; margin: 5px 0;">'
+                f'<h5>{name}</h5>'
+                f'<p style="color: {color}; font-weight: bold;">Tax Change: ${tax_change:,.2f}</p>'
+                f'</div>'
+            )
+        st.markdown(
+            f'<div style="display: grid; grid-template-columns: repeat({min(3, len(cards))}, 1fr); column-gap: 1rem;">'
+            + "".join(cards) + '</div>',
+            unsafe_allow_html=True
+        )
     
         # Waterfall Chart
-        chart_title = []
-        if show_federal: chart_title.append("Federal")
-        if show_state: chart_title.append("State")
-        chart_type = " & ".join(chart_title) + " Tax"
-        
         st.subheader(f"📊 {chart_type} Impact Waterfall Chart")
+        baseline = waterfall_data[0][1]
+        final_total = waterfall_data[-1][1]
         
-        # Calculate baseline
-        federal_baseline = household['Baseline Federal Tax Liability'] if show_federal else 0
-        state_baseline = household.get('State Income Tax', 0) if show_state else 0
-        baseline = federal_baseline + state_baseline
-        
-        # Prepare waterfall data - now using the tax_change directly
-        waterfall_data = [(f"Baseline {chart_type}", baseline, baseline)]
-        running_total = baseline
-        
-        for name, tax_after, tax_change in active_components:  # Now using tax_change directly
-            running_total += tax_change
-            waterfall_data.append((name, tax_change, running_total))
-        
-        # Final total
-        final_total = baseline + total_tax_change
-        waterfall_data.append((f"Final {chart_type}", final_total, final_total))
-
-                
-        # Create FEDERAL INCOME TAX waterfall chart (state option still needed, etc.)
-        fig = go.Figure() 
+        fig = build_waterfall(household_id, show_federal, show_state, chart_type, waterfall_data, baseline, final_total)
         
-        # Add baseline
-        fig.add_trace(go.Waterfall(
-            name=f"{chart_type} Impact",  # Dynamic name based on selection
-            orientation="v",
-            measure=["absolute"] + ["relative"] * len(active_components) + ["total"],
-            x=[item[0] for item in waterfall_data],
-            y=[item[1] for item in waterfall_data],
-            text=[f"${item[1]:,.0f}" for item in waterfall_data],
-            textposition="outside",
-            connector={"line":{"color":"rgb(63, 63, 63)"}},
-            increasing={"marker":{"color":"red"}},  # Tax increases in red
-            decreasing={"marker":{"color":"green"}},  # Tax decreases in green
-            totals={"marker":{"color":"blue"}}
-        ))
-        
-        # Update chart title
-        fig.update_layout(
-            title=f"{chart_type} Liability Changes: ${baseline:,.0f} → ${final_total:,.0f}",
-            xaxis_title="Reform Components",
-            yaxis_title="Tax Liability ($)",
-            showlegend=False,
-            height=500,
-            xaxis={'tickangle': -45}
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig, use_container_width=True, config=WATERFALL_CONFIG)
         
         # Verification
         total_calculated_change = sum([item[1] for item in waterfall_data[1:-1]])
@@ -459,22 +478,159 @@ def main():
     direction = "benefits from" if income_change > 0 else "is burdened by"
 
     
-    # Find the reform with the greatest absolute impact
-    if active_components:
-        biggest_impact_reform = max(active_components, key=lambda x: abs(x[2]))
-        biggest_reform_name = biggest_impact_reform[0]
-        biggest_reform_change = biggest_impact_reform[2]
-        biggest_reform_text = f"The biggest change comes from the {biggest_reform_name} (${biggest_reform_change:+,.2f})."
-    else:
-        biggest_reform_text = "No single reform has a major impact."
-
-    
     st.info(f"""
     **Quick Story Angle:** This {household['State']} household {impact_level} {direction} the HR1 bill, 
     with a net income change of {household['Total Change in Net Income']:,.2f} ({income_pct_change:+.1f}%). 
     {biggest_reform_text}
-    The household represents approximately {f"{math.ceil(weight):,}"} similar American families.
+    The household represents approximately {f"{weight_ceil:,}"} similar American families.
     """)
+
+# Main app
+def main():
+    st.title("🏠 HR1 Tax Bill - Household Impact Dashboard")
+    st.markdown("*Explore how the HR1 tax bill affects individual American households compared to current policy*")
+    
+    # Load the data
+    df, states = load_data()
+    
+    # Sidebar for household selection
+    st.sidebar.header("Select Household")
+    
+    # Initialize filtered dataframe
+    df_filtered = df  # Read-only below; filters rebind it to a subset rather than mutating it
+    
+    ### ALL FILTERS
+    filter_index = build_filter_index(df)
+    selected_idx = []  # Row positions allowed by each active filter
+    with st.sidebar.expander("🔍 Filters"):
+        # Filter 1: Household Weight
+        selected_weight = st.selectbox("Minimum Household Weight:", list(WEIGHT_OPTIONS.keys()))  # Removed .sidebar
+        if WEIGHT_OPTIONS[selected_weight] > 0:
+            selected_idx.append(filter_index['weight'][selected_weight])
+        
+        # Filter 2: Net Income
+        selected_income = st.selectbox("Net Income:", list(INCOME_RANGES.keys()))  # Removed .sidebar
+        if selected_income in filter_index['income']:
+            selected_idx.append(filter_index['income'][selected_income])
+        
+        # Filter 3: State
+        selected_state = st.selectbox("State:", states)  # Removed .sidebar
+        if selected_state != "All States":
+            selected_idx.append(filter_index['state'][selected_state])
+        
+        # Filter 4: Marital Status
+        marital_options = ["All", "Married", "Single"]
+        selected_marital = st.selectbox("Marital Status:", marital_options)  # Removed .sidebar
+        if selected_marital != "All":
+            selected_idx.append(filter_index['marital'][selected_marital])
+        
+        # Filter 5: Number of Dependents
+        selected_dependents = st.selectbox("Number of Dependents:", DEPENDENT_OPTIONS)  # Removed .sidebar
+        if selected_dependents != "All":
+            selected_idx.append(filter_index['dependents'][selected_dependents])
+
+        # Filter 6: Age of Head of Household
+        selected_age = st.selectbox("Head of Household Age:", list(AGE_RANGES.keys()))
+        if selected_age != "All Ages":
+            selected_idx.append(filter_index['age'][selected_age])
+        
+        # One combined pass over the active filters, then a single row take
+        if selected_idx:
+            final_idx = intersect_positions(selected_idx)
+            df_filtered = df_filtered.iloc[final_idx]
+        
+        # Show filter results  
+        st.caption(f"📊 Showing {len(df_filtered):,} of {len(df):,} households")  # Removed .sidebar
+        if len(df_filtered) == 0:
+            st.error("No households match your filters!")  # Removed .sidebar
+            st.stop()
+
+    # Use df_filtered everywhere below this point
+
+    
+    selection_method = st.sidebar.radio(
+        "Selection Method:",
+        ["By Household ID", "Find Interesting Cases", "Random Shuffle"]
+    )
+    
+    if selection_method == "By Household ID":
+        household_id = st.sidebar.selectbox(
+            "Choose Household ID:",
+            df_filtered.index.unique()
+        )
+    
+    elif selection_method == "Random Shuffle":
+        if st.sidebar.button("🎲 Get Random Household"):
+            # Store random selection in session state to persist across reruns
+            st.session_state.random_household = df_filtered['Household ID'].sample(1).iloc[0]
+        
+        # Show the selected random household or pick initial one
+        if 'random_household' not in st.session_state:
+            st.session_state.random_household = df_filtered['Household ID'].sample(1).iloc[0]
+        
+        household_id = st.session_state.random_household
+        st.sidebar.info(f"Random Household ID: {household_id}")
+    else:
+        # Pre-filter for interesting cases with top 20 rankings
+        case_type = st.sidebar.selectbox("Select Case Type:", list(CASE_CATEGORIES.keys()))
+        
+        # Get top 20 households for selected category
+        filter_key = (selected_weight, selected_income, selected_state, selected_marital, selected_dependents, selected_age)
+        ranked_options, household_ids = top20_lookup(df_filtered, filter_key)[case_type]
+        
+        # Let user select from ranked list
+        selected_option = st.sidebar.selectbox(f"Top 20 for {case_type}:", ranked_options)
+        
+        # Get household ID using the index
+        selected_index = ranked_options.index(selected_option)
+        household_id = household_ids[selected_index]
+        # Show it in a card
+        st.sidebar.info(f"Selected Household ID: {household_id}")
+
+    
+    
+    # Get household data
+    household = df_filtered.loc[household_id]
+
+    # Baseline Attributes in Sidebar
+    st.sidebar.subheader("Baseline Household Attributes")
+        
+    st.sidebar.markdown(household['_baseline_md'])
+    # Add children's ages if there are dependents
+    if household['Number of Dependents'] > 0:
+        ages = household[DEP_COLS].to_numpy(dtype=np.float32)
+        dependent_ages = [f"{age:.0f}" for age in ages[ages > 0]]  # NaN compares False, so empty slots drop out
+        
+        if dependent_ages:
+            st.sidebar.markdown(f"**Children's Ages:** {', '.join(dependent_ages)} years")
+    
+
+    if household['Is Married']:
+        st.sidebar.markdown(f"""**Marital Status:** Married  
+    **Spouse Age:** {household['Age of Spouse']:.0f} years""")
+    else:
+        st.sidebar.markdown("**Marital Status:** Single")
+
+    st.sidebar.markdown("**Income Sources:**")
+    income_sources = [
+        ("Employment Income", household['Employment Income']),
+        ("Self-Employment Income", household['Self-Employment Income']),
+        ("Tip Income", household['Tip Income']),
+        ("Overtime Income", household['Overtime Income']),
+        ("Capital Gains", household['Capital Gains'])
+    ]
+
+    for source, amount in income_sources:
+        if amount > 0:
+            st.sidebar.markdown(f"• {source}: ${amount:,.2f}")
+
+
+    # DF row on request; an expander would serialize the row to Arrow on every rerun even while closed
+    if st.sidebar.checkbox("Show Full Dataframe Row"):
+        st.sidebar.dataframe(household[~household.index.str.startswith('_')].to_frame().T, use_container_width=True)
+
+
+    impact_block(df, household_id)
     
 if __name__ == "__main__":
     main()